@@ -5,37 +5,103 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import datetime
+import calendar
 import os
 import io
-import uuid
+import secrets
+import functools
+import hashlib
+import importlib.util
+import itertools
+import concurrent.futures
 from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import create_engine, event, TypeDecorator, Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean, Index, func, insert, literal, select, text, union_all, update
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, joinedload
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.exc import SQLAlchemyError
 
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
-import plotly.express as px
 
 # ---------------------------
 # Configuration
 # ---------------------------
 DB_URI = "sqlite:///dental_clinic.db"
 IMAGES_DIR = "images"
+SCHEMA_VERSION = 4  # bump whenever a table or index is added to the models
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
 CURRENCY_NAME = "جنيه مصري"
 CURRENCY_SYMBOL = "جنيه"
 
+# xlsxwriter writes cells straight to its XML parts; openpyxl builds a Python object per cell first
+EXCEL_ENGINE = "xlsxwriter" if importlib.util.find_spec("xlsxwriter") else "openpyxl"
+
+# Payments list and invoice picker show this many of the newest payments per page
+PAYMENTS_PAGE_SIZE = 200
+
+# Fixed choice lists, built once per process instead of as list literals on every rerun
+GENDERS = ("", "ذكر", "أنثى")
+PAYMENT_METHODS = ("نقدًا", "بطاقة", "تحويل بنكي", "أخرى")
+SUPPLIER_CATEGORIES = ("خامات", "معمل", "خدمات")
+SUPPLIER_PAYMENT_METHODS = ("نقدي", "تحويل بنكي", "شيك", "أخرى")
+
 # ---------------------------
 # Database setup
 # ---------------------------
-engine = create_engine(DB_URI, echo=False, connect_args={"check_same_thread": False})
-Session = sessionmaker(bind=engine)
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL: commits append to the log and reads no longer block on writers
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    # per-connection page cache of ~20 MB, temp b-trees (GROUP BY, ORDER BY) in RAM, file reads via mmap
+    cur.execute("PRAGMA cache_size=-20000")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA mmap_size=268435456")
+    cur.close()
+
+# Streamlit re-executes this script on every rerun; cache_resource keeps one
+# engine and one session factory per server process, shared by all sessions
+@st.cache_resource(show_spinner=False)
+def get_engine():
+    if DB_URI in ("sqlite://", "sqlite:///:memory:"):
+        # a single shared connection, otherwise each thread gets its own empty in-memory database
+        engine = create_engine(DB_URI, echo=False, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    else:
+        # LIFO reuses the most recently returned connection, whose SQLite page cache is still warm
+        engine = create_engine(DB_URI, echo=False, connect_args={"check_same_thread": False}, pool_use_lifo=True)
+    event.listen(engine, "connect", _sqlite_pragmas)
+    return engine
+
+@st.cache_resource(show_spinner=False)
+def get_session_factory():
+    return sessionmaker(bind=get_engine())
+
+engine = get_engine()
+Session = get_session_factory()
 Base = declarative_base()
 
+class EpochDateTime(TypeDecorator):
+    # naive wall-clock datetime stored as INTEGER seconds since 1970-01-01 (read as UTC,
+    # like SQLite's strftime('%s') and date(x, 'unixepoch')): smaller rows and numeric ordering
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, datetime.date):
+            return calendar.timegm(value.timetuple())
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=value)
+
 # ---------------------------
 # Models (including suppliers & daily summary)
 # ---------------------------
@@ -73,14 +139,15 @@ class TreatmentPercentage(Base):
     doctor_percentage = Column(Float)
     treatment = relationship("Treatment")
     doctor = relationship("Doctor")
+    __table_args__ = (Index("ix_tp_treatment_doctor", "treatment_id", "doctor_id"),)
 
 class Appointment(Base):
     __tablename__ = "appointments"
     id = Column(Integer, primary_key=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"))
-    doctor_id = Column(Integer, ForeignKey("doctors.id"))
+    patient_id = Column(Integer, ForeignKey("patients.id"), index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"), index=True)
     treatment_id = Column(Integer, ForeignKey("treatments.id"))
-    date = Column(DateTime)
+    date = Column(EpochDateTime, index=True)
     status = Column(String)
     notes = Column(Text)
     patient = relationship("Patient")
@@ -90,7 +157,7 @@ class Appointment(Base):
 class Payment(Base):
     __tablename__ = "payments"
     id = Column(Integer, primary_key=True)
-    appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=True)
+    appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=True, index=True)
     total_amount = Column(Float)
     paid_amount = Column(Float)
     clinic_share = Column(Float)
@@ -98,7 +165,7 @@ class Payment(Base):
     payment_method = Column(String)
     discounts = Column(Float)
     taxes = Column(Float)
-    date_paid = Column(DateTime)
+    date_paid = Column(EpochDateTime, index=True)
     appointment = relationship("Appointment")
 
 class Expense(Base):
@@ -107,7 +174,7 @@ class Expense(Base):
     description = Column(String)
     category = Column(String)
     amount = Column(Float)
-    date = Column(DateTime)
+    date = Column(EpochDateTime, index=True)
 
 class InventoryItem(Base):
     __tablename__ = "inventory_items"
@@ -121,7 +188,7 @@ class InventoryItem(Base):
 class DailyTransaction(Base):
     __tablename__ = "daily_transactions"
     id = Column(Integer, primary_key=True)
-    date = Column(DateTime, default=datetime.datetime.now)
+    date = Column(EpochDateTime, default=datetime.datetime.now, index=True)
     income = Column(Float, default=0.0)
     expense = Column(Float, default=0.0)
     notes = Column(Text)
@@ -129,7 +196,7 @@ class DailyTransaction(Base):
 class DailySummary(Base):
     __tablename__ = "daily_summaries"
     id = Column(Integer, primary_key=True)
-    date = Column(DateTime, default=datetime.datetime.now)
+    date = Column(DateTime, default=datetime.datetime.now, index=True)
     total_income = Column(Float, default=0.0)
     clinic_income = Column(Float, default=0.0)
     doctor_income = Column(Float, default=0.0)
@@ -153,8 +220,8 @@ class Supplier(Base):
 class SupplierTransaction(Base):
     __tablename__ = "supplier_transactions"
     id = Column(Integer, primary_key=True)
-    supplier_id = Column(Integer, ForeignKey("suppliers.id"))
-    date = Column(DateTime, default=datetime.datetime.now)
+    supplier_id = Column(Integer, ForeignKey("suppliers.id"), index=True)
+    date = Column(DateTime, default=datetime.datetime.now, index=True)
     description = Column(String)
     amount = Column(Float)  # موجب للمورد (دفعنا له) أو سالب (مستحق علينا)
     payment_method = Column(String)
@@ -163,21 +230,79 @@ class SupplierTransaction(Base):
 class SupplierInvoice(Base):
     __tablename__ = "supplier_invoices"
     id = Column(Integer, primary_key=True)
-    supplier_id = Column(Integer, ForeignKey("suppliers.id"))
+    supplier_id = Column(Integer, ForeignKey("suppliers.id"), index=True)
     invoice_no = Column(String)
-    date = Column(DateTime, default=datetime.datetime.now)
+    date = Column(DateTime, default=datetime.datetime.now, index=True)
     amount = Column(Float)
     paid = Column(Boolean, default=False)
     description = Column(Text)
     supplier = relationship("Supplier", back_populates="invoices")
 
-Base.metadata.create_all(engine)
+@st.cache_resource(show_spinner=False)
+def init_db(_engine):
+    # PRAGMA user_version records the schema already applied, so an up-to-date
+    # database costs one PRAGMA instead of a sqlite_master probe per table
+    with _engine.begin() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        if version >= SCHEMA_VERSION:
+            return
+        Base.metadata.create_all(conn)
+        # create_all skips existing tables, so add indexes declared after a table was created
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        if version < 2:
+            # v2: appointment and payment timestamps move from ISO text to EpochDateTime
+            for table, column in (("appointments", "date"), ("payments", "date_paid")):
+                conn.exec_driver_sql(f"UPDATE {table} SET {column} = CAST(strftime('%s', {column}) AS INTEGER) WHERE typeof({column}) = 'text'")
+        if version < 4:
+            # v4: expense and daily transaction dates follow
+            for table in ("expenses", "daily_transactions"):
+                conn.exec_driver_sql(f"UPDATE {table} SET date = CAST(strftime('%s', date) AS INTEGER) WHERE typeof(date) = 'text'")
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+init_db(engine)
+
+# ---------------------------
+# Data versions (cache invalidation)
+# ---------------------------
+@st.cache_resource(show_spinner=False)
+def _data_versions():
+    # shared by every user session in this server process
+    return {}
+
+def data_version(*tables):
+    versions = _data_versions()
+    return tuple(versions.get(t, 0) for t in tables)
+
+def bump_data_version(*tables):
+    versions = _data_versions()
+    for t in tables:
+        versions[t] = versions.get(t, 0) + 1
+
+def cached_read(*tables, **cache_kwargs):
+    # st.cache_data keyed on the data version of the tables the reader touches,
+    # so any committed write to those tables invalidates it
+    cache_kwargs.setdefault("max_entries", 16)
+
+    def decorator(func):
+        @st.cache_data(show_spinner=False, **cache_kwargs)
+        @functools.wraps(func)
+        def versioned(version, *args, **kwargs):
+            return func(*args, **kwargs)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return versioned(data_version(*tables), *args, **kwargs)
+        return wrapper
+    return decorator
 
 # ---------------------------
 # Session helper
 # ---------------------------
 @contextmanager
-def session_scope():
+def session_scope(*tables):
+    # tables: names of the tables written in this scope; their data version is bumped after commit
     session = Session()
     try:
         yield session
@@ -187,21 +312,60 @@ def session_scope():
         raise
     finally:
         session.close()
+    bump_data_version(*tables)
+
+@contextmanager
+def read_session():
+    # for pure reads: no COMMIT round trip (and no WAL write) on exit
+    session = Session()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@contextmanager
+def read_conn():
+    # plain Core connection for flat list reads: no Session, identity map or ORM instances
+    with engine.connect() as conn:
+        yield conn
+
+@st.cache_resource(show_spinner=False)
+def _read_executor():
+    return concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="read")
+
+def gather(**fns):
+    # independent reads side by side, each on its own pooled connection; WAL lets the readers overlap.
+    # Workers run under the caller's script context, so the st.cache_data readers behave as on the main thread.
+    ctx = get_script_run_ctx()
+    def run(f):
+        add_script_run_ctx(ctx=ctx)
+        return f()
+    futures = {k: _read_executor().submit(run, f) for k, f in fns.items()}
+    return {k: f.result() for k, f in futures.items()}
 
 # ---------------------------
 # Utilities
 # ---------------------------
-def secure_filename(filename):
-    base, ext = os.path.splitext(filename) if filename else ("file", ".png")
-    return f"{uuid.uuid4().hex}{ext}"
+def secure_filename(filename, data):
+    # content-addressed: the same image uploaded twice maps to one file
+    ext = os.path.splitext(filename)[1] if filename else ".png"
+    return f"{hashlib.blake2b(data, digest_size=16).hexdigest()}{ext}"
 
 def save_uploaded_image(uploaded_file, prefix="img"):
     if uploaded_file is None:
         return None
-    filename = secure_filename(getattr(uploaded_file, "name", None))
-    path = os.path.join(IMAGES_DIR, f"{prefix}_{filename}")
-    with open(path, "wb") as f:
-        f.write(uploaded_file.getvalue())
+    data = uploaded_file.getvalue()
+    path = os.path.join(IMAGES_DIR, f"{prefix}_{secure_filename(getattr(uploaded_file, 'name', None), data)}")
+    # written before the row that points at it commits: a failed write raises and rolls the row back.
+    # temp file + rename, so a partial write never sits at the content-addressed name
+    if not os.path.exists(path):
+        tmp = f"{path}.{secrets.token_hex(4)}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
     return path
 
 def datetime_input(label, default=None):
@@ -211,12 +375,38 @@ def datetime_input(label, default=None):
     time_part = st.time_input(f"{label} - الوقت", value=default.time())
     return datetime.datetime.combine(date_part, time_part)
 
+def csv_rows(uploaded_file, columns, date_columns=(), numeric_columns=(), required=(), chunksize=5000):
+    # CSV upload -> insert-ready dicts: unknown columns dropped, blanks as None, dates parsed once per column.
+    # Cells are read as text (a phone "010..." keeps its zero); only numeric_columns and date_columns are converted,
+    # unparseable values becoming None. Rows missing a required value are skipped.
+    # Yields lazily, chunk by chunk, so the bulk helpers can stream a large file.
+    for df in pd.read_csv(uploaded_file, chunksize=chunksize, dtype=str):
+        missing = [c for c in required if c not in df.columns]
+        if missing: raise ValueError(f"أعمدة مفقودة في الملف: {', '.join(missing)}")
+        df = df[[c for c in columns if c in df.columns]]
+        for c in numeric_columns:
+            if c in df.columns: df[c] = pd.to_numeric(df[c], errors="coerce")
+        for c in date_columns:
+            if c in df.columns: df[c] = pd.to_datetime(df[c], errors="coerce")
+        for c in required:
+            if df[c].dtype == object: df[c] = df[c].where(df[c].astype(str).str.strip() != "")
+        df = df.dropna(subset=list(required))
+        yield from df.astype(object).where(df.notna(), None).to_dict("records")
+
+def run_csv_import(bulk_add, rows):
+    # the import is one transaction, so a bad file or row rolls it all back; say so instead of a traceback
+    try:
+        n = bulk_add(rows)
+    except (ValueError, pd.errors.ParserError, SQLAlchemyError) as e:
+        st.error(f"تعذّر الاستيراد، لم يُحفظ أي سجل: {e}")
+    else:
+        st.success(f"تم استيراد {n} سجل")
+
 def df_to_excel_bytes(df):
+    # the writer serializes straight into the buffer and saves on exit
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+    with pd.ExcelWriter(output, engine=EXCEL_ENGINE) as writer:
         df.to_excel(writer, index=False, sheet_name="Sheet1")
-        writer.save()
-    output.seek(0)
     return output.getvalue()
 
 def format_money(x):
@@ -225,74 +415,118 @@ def format_money(x):
     except Exception:
         return f"0.00 {CURRENCY_SYMBOL}"
 
+def _draw_invoice_page(c, payment=None, appointment=None):
+    width, height = letter
+    lines = []  # (text, space below the line)
+    if payment:
+        p = payment
+        appt = p.appointment
+        lines.append((f"تاريخ الدفع: {p.date_paid.strftime('%Y-%m-%d %H:%M') if p.date_paid else ''}", 20))
+        if appt:
+            lines += [(f"المريض: {appt.patient.name if appt.patient else ''}", 15),
+                      (f"الطبيب: {appt.doctor.name if appt.doctor else ''}", 15),
+                      (f"العلاج: {appt.treatment.name if appt.treatment else ''}", 20)]
+        lines += [(f"المبلغ الإجمالي: {p.total_amount or 0.0} {CURRENCY_SYMBOL}", 15),
+                  (f"الخصم: {p.discounts or 0.0} {CURRENCY_SYMBOL}", 15),
+                  (f"الضريبة: {p.taxes or 0.0} {CURRENCY_SYMBOL}", 15),
+                  (f"حصة العيادة: {p.clinic_share or 0.0} {CURRENCY_SYMBOL}", 15),
+                  (f"حصة الطبيب: {p.doctor_share or 0.0} {CURRENCY_SYMBOL}", 15),
+                  (f"المدفوع: {p.paid_amount or 0.0} {CURRENCY_SYMBOL}", 30)]
+    elif appointment:
+        a = appointment
+        lines += [(f"تاريخ الموعد: {a.date.strftime('%Y-%m-%d %H:%M') if a.date else ''}", 20),
+                  (f"المريض: {a.patient.name if a.patient else ''}", 15),
+                  (f"الطبيب: {a.doctor.name if a.doctor else ''}", 15),
+                  (f"العلاج: {a.treatment.name if a.treatment else ''}", 15),
+                  (f"ملاحظات: {a.notes or ''}", 20)]
+    # a single text object: fonts are set once and lines advance by leading,
+    # instead of a font + positioning operator per drawString
+    t = c.beginText(50, height - 50)
+    t.setFont("Helvetica-Bold", 16, leading=30)
+    t.textLine("فاتورة - عيادة الأسنان")
+    t.setFont("Helvetica", 11)
+    leading = None
+    for text, space in lines:
+        if space != leading:
+            t.setLeading(space); leading = space
+        t.textLine(text)
+    c.drawText(t)
+    c.showPage()
+
 def generate_invoice_pdf_buffer(payment_id=None, appointment_id=None):
     buf = io.BytesIO()
     c = canvas.Canvas(buf, pagesize=letter)
-    width, height = letter
-    y = height - 50
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(50, y, "فاتورة - عيادة الأسنان")
-    y -= 30
-    with session_scope() as s:
+    with read_session() as s:
+        # the page reads appointment.patient/doctor/treatment; load them in the same SELECT
+        people = (joinedload(Appointment.patient), joinedload(Appointment.doctor), joinedload(Appointment.treatment))
         if payment_id:
-            p = s.get(Payment, payment_id)
-            if p:
-                appt = p.appointment
-                c.setFont("Helvetica", 11)
-                c.drawString(50, y, f"تاريخ الدفع: {p.date_paid.strftime('%Y-%m-%d %H:%M') if p.date_paid else ''}")
-                y -= 20
-                if appt:
-                    c.drawString(50, y, f"المريض: {appt.patient.name if appt.patient else ''}")
-                    y -= 15
-                    c.drawString(50, y, f"الطبيب: {appt.doctor.name if appt.doctor else ''}")
-                    y -= 15
-                    c.drawString(50, y, f"العلاج: {appt.treatment.name if appt.treatment else ''}")
-                    y -= 20
-                c.drawString(50, y, f"المبلغ الإجمالي: {p.total_amount or 0.0} {CURRENCY_SYMBOL}")
-                y -= 15
-                c.drawString(50, y, f"الخصم: {p.discounts or 0.0} {CURRENCY_SYMBOL}")
-                y -= 15
-                c.drawString(50, y, f"الضريبة: {p.taxes or 0.0} {CURRENCY_SYMBOL}")
-                y -= 15
-                c.drawString(50, y, f"حصة العيادة: {p.clinic_share or 0.0} {CURRENCY_SYMBOL}")
-                y -= 15
-                c.drawString(50, y, f"حصة الطبيب: {p.doctor_share or 0.0} {CURRENCY_SYMBOL}")
-                y -= 15
-                c.drawString(50, y, f"المدفوع: {p.paid_amount or 0.0} {CURRENCY_SYMBOL}")
-                y -= 30
+            _draw_invoice_page(c, payment=s.get(Payment, payment_id, options=[joinedload(Payment.appointment).options(*people)]))
         elif appointment_id:
-            a = s.get(Appointment, appointment_id)
-            if a:
-                c.setFont("Helvetica", 11)
-                c.drawString(50, y, f"تاريخ الموعد: {a.date.strftime('%Y-%m-%d %H:%M') if a.date else ''}")
-                y -= 20
-                c.drawString(50, y, f"المريض: {a.patient.name if a.patient else ''}")
-                y -= 15
-                c.drawString(50, y, f"الطبيب: {a.doctor.name if a.doctor else ''}")
-                y -= 15
-                c.drawString(50, y, f"العلاج: {a.treatment.name if a.treatment else ''}")
-                y -= 15
-                c.drawString(50, y, f"ملاحظات: {a.notes or ''}")
-                y -= 20
-    c.showPage()
+            _draw_invoice_page(c, appointment=s.get(Appointment, appointment_id, options=people))
+        else:
+            _draw_invoice_page(c)
+    c.save()
+    buf.seek(0)
+    return buf
+
+def generate_invoices_pdf(payment_ids):
+    # one canvas, one session and one query for the whole batch; a page per invoice
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
+    with read_session() as s:
+        appt = joinedload(Payment.appointment)
+        rows = (s.query(Payment)
+                .options(appt.joinedload(Appointment.patient), appt.joinedload(Appointment.doctor), appt.joinedload(Appointment.treatment))
+                .filter(Payment.id.in_(payment_ids)).all())
+        by_id = {p.id: p for p in rows}
+        for pid in payment_ids:
+            if pid in by_id:
+                _draw_invoice_page(c, payment=by_id[pid])
     c.save()
     buf.seek(0)
     return buf
 
+@cached_read("payments", "appointments", "patients", "doctors", "treatments", max_entries=128)
+def invoice_pdf_bytes(payment_id):
+    # rendering is CPU-heavy; repeat downloads of the same invoice reuse the bytes
+    return generate_invoice_pdf_buffer(payment_id=payment_id).getvalue()
+
+@cached_read("payments", "appointments", "patients", "doctors", "treatments", max_entries=16)
+def invoices_pdf_bytes(payment_ids):
+    return generate_invoices_pdf(payment_ids).getvalue()
+
 # ---------------------------
 # Core CRUD + Safe GETs (return dicts)
 # ---------------------------
 
+# Bulk inserts: executemany in one transaction instead of a commit per row.
+# rows may be any iterable; it is consumed in slices so a large import is never held as one list.
+def bulk_insert(model, rows, chunk_size=1000):
+    rows = iter(rows)
+    batch = list(itertools.islice(rows, chunk_size))
+    if not batch:
+        return 0
+    count = 0
+    with session_scope(model.__tablename__) as s:
+        while batch:
+            s.execute(insert(model), batch); count += len(batch)
+            batch = list(itertools.islice(rows, chunk_size))
+    return count
+
 # Patients
 def add_patient(name, age=None, gender=None, phone=None, address=None, medical_history=None, image=None):
-    with session_scope() as s:
+    with session_scope("patients") as s:
         p = Patient(name=name, age=age, gender=gender, phone=phone, address=address, medical_history=medical_history)
         if image:
             p.image_path = save_uploaded_image(image, prefix="patient")
         s.add(p); s.flush(); return p.id
 
+def bulk_add_patients(rows):
+    # rows: dicts keyed by Patient column names
+    return bulk_insert(Patient, rows)
+
 def edit_patient(patient_id, name, age, gender, phone, address, medical_history, image=None):
-    with session_scope() as s:
+    with session_scope("patients") as s:
         p = s.get(Patient, patient_id)
         if not p: return False
         p.name = name; p.age = age; p.gender = gender; p.phone = phone; p.address = address; p.medical_history = medical_history
@@ -301,70 +535,78 @@ def edit_patient(patient_id, name, age, gender, phone, address, medical_history,
         return True
 
 def delete_patient(patient_id):
-    with session_scope() as s:
+    with session_scope("patients") as s:
         p = s.get(Patient, patient_id)
         if not p: return False
         s.delete(p); return True
 
-def get_patients():
-    with session_scope() as s:
-        rows = s.query(Patient).order_by(Patient.id).all()
-        data = []
-        for r in rows:
-            data.append({
-                "id": r.id, "name": r.name, "age": r.age, "gender": r.gender,
-                "phone": r.phone, "address": r.address, "medical_history": r.medical_history,
-                "image_path": r.image_path
-            })
-        return data
+@cached_read("patients")
+def get_patient_count():
+    with read_conn() as c:
+        return c.execute(select(func.count()).select_from(Patient)).scalar()
+
+@cached_read("patients")
+def patients_dataframe():
+    # columnar load straight from sqlite3 rows, no ORM objects or per-row dicts
+    df = pd.read_sql_query("SELECT id, name, age, gender, phone, address, medical_history, image_path FROM patients ORDER BY id", engine, dtype={"age": "Int64"})
+    # one lowercase haystack per row, so a search is a single vectorized str.contains
+    text = df.astype("string").fillna("")
+    df["_search"] = text.iloc[:, 0].str.cat(text.iloc[:, 1:], sep=" ").str.lower()
+    return df
 
 # Doctors
 def add_doctor(name, specialty=None, phone=None, email=None):
-    with session_scope() as s:
+    with session_scope("doctors") as s:
         d = Doctor(name=name, specialty=specialty, phone=phone, email=email); s.add(d); s.flush(); return d.id
 
+def bulk_add_doctors(rows):
+    # rows: dicts keyed by Doctor column names
+    return bulk_insert(Doctor, rows)
+
 def edit_doctor(doctor_id, name, specialty, phone, email):
-    with session_scope() as s:
+    with session_scope("doctors") as s:
         d = s.get(Doctor, doctor_id)
         if not d: return False
         d.name = name; d.specialty = specialty; d.phone = phone; d.email = email; return True
 
 def delete_doctor(doctor_id):
-    with session_scope() as s:
+    with session_scope("doctors") as s:
         d = s.get(Doctor, doctor_id)
         if not d: return False
         s.delete(d); return True
 
-def get_doctors():
-    with session_scope() as s:
-        rows = s.query(Doctor).order_by(Doctor.id).all()
-        return [{"id": r.id, "name": r.name, "specialty": r.specialty, "phone": r.phone, "email": r.email} for r in rows]
+@cached_read("doctors")
+def doctors_dataframe():
+    return pd.read_sql_query("SELECT id, name, specialty, phone, email FROM doctors ORDER BY id", engine)
 
 # Treatments
 def add_treatment(name, base_cost=0.0):
-    with session_scope() as s:
+    with session_scope("treatments") as s:
         t = Treatment(name=name, base_cost=base_cost); s.add(t); s.flush(); return t.id
 
+def bulk_add_treatments(rows):
+    # rows: dicts keyed by Treatment column names; a blank base_cost takes add_treatment's default
+    return bulk_insert(Treatment, ({**r, "base_cost": 0.0 if r.get("base_cost") is None else r["base_cost"]} for r in rows))
+
 def edit_treatment(treatment_id, name, base_cost):
-    with session_scope() as s:
+    with session_scope("treatments") as s:
         t = s.get(Treatment, treatment_id)
         if not t: return False
         t.name = name; t.base_cost = base_cost; return True
 
 def delete_treatment(treatment_id):
-    with session_scope() as s:
+    with session_scope("treatments") as s:
         t = s.get(Treatment, treatment_id)
         if not t: return False
         s.delete(t); return True
 
-def get_treatments():
-    with session_scope() as s:
-        rows = s.query(Treatment).order_by(Treatment.id).all()
-        return [{"id": r.id, "name": r.name, "base_cost": r.base_cost} for r in rows]
+@cached_read("treatments")
+def treatments_dataframe():
+    return pd.read_sql_query("SELECT id, name, base_cost FROM treatments ORDER BY id", engine)
 
 # Treatment percentages
 def set_treatment_percentage(treatment_id, doctor_id, clinic_percentage, doctor_percentage):
-    with session_scope() as s:
+    with session_scope("treatment_percentages") as s:
         tp = s.query(TreatmentPercentage).filter_by(treatment_id=treatment_id, doctor_id=doctor_id).first()
         if not tp:
             tp = TreatmentPercentage(treatment_id=treatment_id, doctor_id=doctor_id, clinic_percentage=clinic_percentage, doctor_percentage=doctor_percentage)
@@ -373,256 +615,357 @@ def set_treatment_percentage(treatment_id, doctor_id, clinic_percentage, doctor_
             tp.clinic_percentage = clinic_percentage; tp.doctor_percentage = doctor_percentage
         s.flush(); return True
 
+@cached_read("treatment_percentages", "treatments", "doctors")
 def get_treatment_percentages():
-    with session_scope() as s:
-        rows = s.query(TreatmentPercentage).order_by(TreatmentPercentage.id).all()
-        data = []
-        for r in rows:
-            data.append({
-                "id": r.id,
-                "treatment_id": r.treatment_id,
-                "treatment_name": r.treatment.name if r.treatment else None,
-                "doctor_id": r.doctor_id,
-                "doctor_name": r.doctor.name if r.doctor else None,
-                "clinic_percentage": r.clinic_percentage,
-                "doctor_percentage": r.doctor_percentage
-            })
-        return data
+    with read_conn() as c:
+        rows = c.execute(select(TreatmentPercentage.id, TreatmentPercentage.treatment_id, Treatment.name.label("treatment_name"),
+                                TreatmentPercentage.doctor_id, Doctor.name.label("doctor_name"), TreatmentPercentage.clinic_percentage, TreatmentPercentage.doctor_percentage)
+                         .outerjoin(Treatment, TreatmentPercentage.treatment_id == Treatment.id).outerjoin(Doctor, TreatmentPercentage.doctor_id == Doctor.id)
+                         .order_by(TreatmentPercentage.id)).mappings()
+        return [dict(r) for r in rows]
+
+# Selectbox options: (label, id) pairs, rebuilt only when the table changes.
+# Plain (id, name) rows: no ORM instances or identity-map bookkeeping.
+@cached_read("patients")
+def patient_options():
+    with read_session() as s:
+        rows = s.execute(select(Patient.id, Patient.name).order_by(Patient.id)).all()
+        return [(f"{r.id} - {r.name}", r.id) for r in rows]
+
+@cached_read("doctors")
+def doctor_options():
+    with read_session() as s:
+        rows = s.execute(select(Doctor.id, Doctor.name).order_by(Doctor.id)).all()
+        return [(f"{r.id} - {r.name}", r.id) for r in rows]
+
+@cached_read("treatments")
+def treatment_options():
+    with read_session() as s:
+        rows = s.execute(select(Treatment.id, Treatment.name).order_by(Treatment.id)).all()
+        return [(f"{r.id} - {r.name}", r.id) for r in rows]
+
+@cached_read("appointments", "patients")
+def appointment_options():
+    with read_session() as s:
+        rows = s.execute(select(Appointment.id, Patient.name).outerjoin(Patient, Appointment.patient_id == Patient.id).order_by(Appointment.date.desc())).all()
+        return [(f"{r.id} - {r.name or ''}", r.id) for r in rows]
 
 # Appointments
 def add_appointment(patient_id, doctor_id, treatment_id, date, status="مجدول", notes=None):
-    with session_scope() as s:
+    with session_scope("appointments") as s:
         a = Appointment(patient_id=patient_id, doctor_id=doctor_id, treatment_id=treatment_id, date=date, status=status, notes=notes)
         s.add(a); s.flush(); return a.id
 
 def edit_appointment(appointment_id, patient_id, doctor_id, treatment_id, date, status, notes):
-    with session_scope() as s:
+    with session_scope("appointments") as s:
         a = s.get(Appointment, appointment_id)
         if not a: return False
         a.patient_id = patient_id; a.doctor_id = doctor_id; a.treatment_id = treatment_id; a.date = date; a.status = status; a.notes = notes
         return True
 
 def delete_appointment(appointment_id):
-    with session_scope() as s:
+    with session_scope("appointments") as s:
         a = s.get(Appointment, appointment_id)
         if not a: return False
         s.delete(a); return True
 
+# The hot appointment list as a module-level textual SELECT: each rerun only binds and runs it, with no
+# ORM query building or instance construction; .columns() keeps the epoch date typed.
+_Q_GET_APPTS = text("SELECT a.id, a.patient_id, p.name AS patient_name, a.doctor_id, d.name AS doctor_name, a.treatment_id, t.name AS treatment_name, a.date, a.status, a.notes "
+                    "FROM appointments a LEFT JOIN patients p ON p.id = a.patient_id LEFT JOIN doctors d ON d.id = a.doctor_id LEFT JOIN treatments t ON t.id = a.treatment_id "
+                    "ORDER BY a.date DESC").columns(date=EpochDateTime())
+
+@cached_read("appointments", "patients", "doctors", "treatments")
 def get_appointments():
-    with session_scope() as s:
-        rows = s.query(Appointment).order_by(Appointment.date.desc()).all()
-        data = []
-        for r in rows:
-            data.append({
-                "id": r.id,
-                "patient_id": r.patient_id,
-                "patient_name": r.patient.name if r.patient else None,
-                "doctor_id": r.doctor_id,
-                "doctor_name": r.doctor.name if r.doctor else None,
-                "treatment_id": r.treatment_id,
-                "treatment_name": r.treatment.name if r.treatment else None,
-                "date": r.date,
-                "status": r.status,
-                "notes": r.notes
-            })
-        return data
+    with read_conn() as c:
+        return [dict(r) for r in c.execute(_Q_GET_APPTS).mappings()]
+
+@cached_read("appointments", "patients", "doctors", "treatments")
+def appointments_dataframe():
+    return pd.read_sql_query(_Q_GET_APPTS, engine)
+
+# patient_id -> that patient's appointments (newest first), grouped once per data version
+@cached_read("appointments", "patients", "doctors", "treatments")
+def appointments_by_patient():
+    grouped = {}
+    for a in get_appointments():
+        grouped.setdefault(a["patient_id"], []).append(a)
+    return grouped
 
 # Payments
-def calculate_shares(appointment_id, total_amount, discounts=0.0, taxes=0.0):
-    with session_scope() as s:
-        appointment = s.get(Appointment, appointment_id) if appointment_id else None
-        if appointment:
-            perc = s.query(TreatmentPercentage).filter_by(treatment_id=appointment.treatment_id, doctor_id=appointment.doctor_id).first()
-            if perc:
-                clinic_perc = perc.clinic_percentage or 50.0; doctor_perc = perc.doctor_percentage or 50.0
-            else:
-                clinic_perc = doctor_perc = 50.0
-        else:
-            clinic_perc = doctor_perc = 50.0
+@cached_read("treatment_percentages")
+def percentage_map():
+    # (treatment_id, doctor_id) -> (clinic %, doctor %); descending id so the oldest row wins, like .first()
+    with read_session() as s:
+        rows = s.execute(select(TreatmentPercentage.treatment_id, TreatmentPercentage.doctor_id, TreatmentPercentage.clinic_percentage, TreatmentPercentage.doctor_percentage)
+                         .order_by(TreatmentPercentage.id.desc())).all()
+        return {(r.treatment_id, r.doctor_id): (r.clinic_percentage or 50.0, r.doctor_percentage or 50.0) for r in rows}
+
+def split_shares(percentages, total_amount, discounts=0.0, taxes=0.0):
+    clinic_perc, doctor_perc = percentages
     net = float(total_amount) - float(discounts or 0.0) + float(taxes or 0.0)
     clinic = round(net * (clinic_perc / 100.0), 2)
     doctor = round(net * (doctor_perc / 100.0), 2)
     return clinic, doctor
 
+def calculate_shares(appointment_id, total_amount, discounts=0.0, taxes=0.0):
+    key = None
+    if appointment_id:
+        with read_session() as s:
+            appointment = s.get(Appointment, appointment_id)
+            key = (appointment.treatment_id, appointment.doctor_id) if appointment else None
+    return split_shares(percentage_map().get(key, (50.0, 50.0)), total_amount, discounts, taxes)
+
 def add_payment(appointment_id, total_amount, paid_amount, payment_method, discounts=0.0, taxes=0.0):
     clinic_share, doctor_share = calculate_shares(appointment_id, total_amount, discounts, taxes)
-    with session_scope() as s:
+    with session_scope("payments") as s:
         p = Payment(appointment_id=appointment_id, total_amount=total_amount, paid_amount=paid_amount,
                     clinic_share=clinic_share, doctor_share=doctor_share, payment_method=payment_method,
                     discounts=discounts, taxes=taxes, date_paid=datetime.datetime.now())
         s.add(p); s.flush(); return p.id
 
+def bulk_add_payments(rows):
+    # shares for the whole batch from one appointments lookup instead of a query per row
+    rows = [dict(r) for r in rows]
+    appt_ids = {r["appointment_id"] for r in rows if r.get("appointment_id")}
+    keys = {}
+    if appt_ids:
+        with read_session() as s:
+            keys = {r.id: (r.treatment_id, r.doctor_id) for r in s.execute(select(Appointment.id, Appointment.treatment_id, Appointment.doctor_id).where(Appointment.id.in_(appt_ids)))}
+    percentages = percentage_map(); now = datetime.datetime.now()
+    for r in rows:
+        r["total_amount"] = float(r.get("total_amount") or 0.0); r["paid_amount"] = float(r.get("paid_amount") or 0.0)
+        r["discounts"] = float(r.get("discounts") or 0.0); r["taxes"] = float(r.get("taxes") or 0.0)
+        r["clinic_share"], r["doctor_share"] = split_shares(percentages.get(keys.get(r.get("appointment_id")), (50.0, 50.0)), r["total_amount"], r["discounts"], r["taxes"])
+        r["date_paid"] = r.get("date_paid") or now
+    return bulk_insert(Payment, rows)
+
 def delete_payment(payment_id):
-    with session_scope() as s:
+    with session_scope("payments") as s:
         p = s.get(Payment, payment_id)
         if not p: return False
         s.delete(p); return True
 
-def get_payments():
-    with session_scope() as s:
-        rows = s.query(Payment).order_by(Payment.date_paid.desc()).all()
-        data = []
-        for r in rows:
-            data.append({
-                "id": r.id,
-                "appointment_id": r.appointment_id,
-                "total_amount": r.total_amount,
-                "paid_amount": r.paid_amount,
-                "clinic_share": r.clinic_share,
-                "doctor_share": r.doctor_share,
-                "payment_method": r.payment_method,
-                "discounts": r.discounts,
-                "taxes": r.taxes,
-                "date_paid": r.date_paid
-            })
-        return data
+@cached_read("payments")
+def payment_count():
+    with read_conn() as c:
+        return c.execute(select(func.count()).select_from(Payment)).scalar()
+
+# Invoice picker ids in the list's order, from one id-only query; id breaks date ties so pages never overlap
+@cached_read("payments")
+def payment_ids(page=1):
+    with read_conn() as c:
+        return c.execute(select(Payment.id).order_by(Payment.date_paid.desc(), Payment.id.desc())
+                         .limit(PAYMENTS_PAGE_SIZE).offset((page - 1) * PAYMENTS_PAGE_SIZE)).scalars().all()
+
+# Display frames, rebuilt once per table version rather than on every rerun of the page.
+# Read columnar with read_sql_query: no ORM instances and no per-row dicts.
+@cached_read("payments")
+def payments_dataframe(page=1):
+    return pd.read_sql_query("SELECT id, appointment_id, total_amount, paid_amount, clinic_share, doctor_share, payment_method, discounts, taxes, date_paid FROM payments ORDER BY date_paid DESC, id DESC LIMIT ? OFFSET ?",
+                             engine, params=(PAYMENTS_PAGE_SIZE, (page - 1) * PAYMENTS_PAGE_SIZE), parse_dates={"date_paid": {"unit": "s"}})
 
 # Expenses
 def add_expense(description, amount, category=None, date=None):
     if date is None: date = datetime.datetime.now()
-    with session_scope() as s:
+    with session_scope("expenses") as s:
         e = Expense(description=description, amount=amount, category=category, date=date)
         s.add(e); s.flush(); return e.id
 
+def bulk_add_expenses(rows):
+    now = datetime.datetime.now()
+    return bulk_insert(Expense, ({**r, "date": r.get("date") or now} for r in rows))
+
 def delete_expense(expense_id):
-    with session_scope() as s:
+    with session_scope("expenses") as s:
         e = s.get(Expense, expense_id)
         if not e: return False
         s.delete(e); return True
 
-def get_expenses():
-    with session_scope() as s:
-        rows = s.query(Expense).order_by(Expense.date.desc()).all()
-        return [{"id": r.id, "description": r.description, "category": r.category, "amount": r.amount, "date": r.date} for r in rows]
+@cached_read("expenses")
+def expenses_dataframe():
+    return pd.read_sql_query("SELECT id, description, category, amount, date FROM expenses ORDER BY date DESC", engine, parse_dates={"date": {"unit": "s"}})
 
 # Inventory
 def add_inventory_item(name, quantity=0.0, unit=None, cost_per_unit=0.0, low_threshold=5.0):
-    with session_scope() as s:
+    with session_scope("inventory_items") as s:
         it = InventoryItem(name=name, quantity=quantity, unit=unit, cost_per_unit=cost_per_unit, low_threshold=low_threshold)
         s.add(it); s.flush(); return it.id
 
+def bulk_add_inventory_items(rows):
+    # rows: dicts keyed by InventoryItem column names; blanks take add_inventory_item's defaults
+    defaults = {"quantity": 0.0, "cost_per_unit": 0.0, "low_threshold": 5.0}
+    return bulk_insert(InventoryItem, ({**r, **{k: v for k, v in defaults.items() if r.get(k) is None}} for r in rows))
+
 def edit_inventory_item(item_id, name, quantity, unit, cost_per_unit, low_threshold):
-    with session_scope() as s:
+    with session_scope("inventory_items") as s:
         it = s.get(InventoryItem, item_id)
         if not it: return False
         it.name = name; it.quantity = quantity; it.unit = unit; it.cost_per_unit = cost_per_unit; it.low_threshold = low_threshold; return True
 
 def delete_inventory_item(item_id):
-    with session_scope() as s:
+    with session_scope("inventory_items") as s:
         it = s.get(InventoryItem, item_id)
         if not it: return False
         s.delete(it); return True
 
-def get_inventory_items():
-    with session_scope() as s:
-        rows = s.query(InventoryItem).order_by(InventoryItem.id).all()
-        return [{"id": r.id, "name": r.name, "quantity": r.quantity, "unit": r.unit, "cost_per_unit": r.cost_per_unit, "low_threshold": r.low_threshold} for r in rows]
+@cached_read("inventory_items")
+def get_low_inventory():
+    # only the rows the dashboard alert shows; a NULL quantity never matches, as before
+    with read_conn() as c:
+        rows = c.execute(select(InventoryItem.name, InventoryItem.quantity, InventoryItem.unit)
+                         .where(InventoryItem.quantity <= func.coalesce(InventoryItem.low_threshold, 0)).order_by(InventoryItem.id)).mappings()
+        return [dict(r) for r in rows]
+
+@cached_read("inventory_items")
+def inventory_dataframe():
+    return pd.read_sql_query("SELECT id, name, quantity, unit, cost_per_unit, low_threshold FROM inventory_items ORDER BY id", engine)
 
 # Daily transactions & summaries
 def add_daily_transaction(date, income, expense, notes=None):
-    with session_scope() as s:
+    with session_scope("daily_transactions") as s:
         d = DailyTransaction(date=date, income=income, expense=expense, notes=notes)
         s.add(d); s.flush(); return d.id
 
-def get_daily_transactions():
-    with session_scope() as s:
-        rows = s.query(DailyTransaction).order_by(DailyTransaction.date.desc()).all()
-        return [{"id": r.id, "date": r.date, "income": r.income, "expense": r.expense, "notes": r.notes} for r in rows]
-
 def add_daily_summary(date, total_income, clinic_income, doctor_income, total_expenses, net_profit, notes=None):
-    with session_scope() as s:
+    with session_scope("daily_summaries") as s:
         d = DailySummary(date=date, total_income=total_income, clinic_income=clinic_income, doctor_income=doctor_income, total_expenses=total_expenses, net_profit=net_profit, notes=notes)
         s.add(d); s.flush(); return d.id
 
-def get_daily_summaries():
-    with session_scope() as s:
-        rows = s.query(DailySummary).order_by(DailySummary.date.desc()).all()
-        return [{"id": r.id, "date": r.date, "total_income": r.total_income, "clinic_income": r.clinic_income, "doctor_income": r.doctor_income, "total_expenses": r.total_expenses, "net_profit": r.net_profit, "notes": r.notes} for r in rows]
+@cached_read("daily_summaries")
+def daily_summaries_dataframe():
+    return pd.read_sql_query("SELECT id, date, total_income, clinic_income, doctor_income, total_expenses, net_profit, notes FROM daily_summaries ORDER BY date DESC", engine, parse_dates=["date"])
 
 # Suppliers & invoices & transactions
 def add_supplier(name, category=None, phone=None, address=None, notes=None):
-    with session_scope() as s:
+    with session_scope("suppliers") as s:
         sup = Supplier(name=name, category=category, phone=phone, address=address, notes=notes)
         s.add(sup); s.flush(); return sup.id
 
 def edit_supplier(supplier_id, name, category, phone, address, notes):
-    with session_scope() as s:
+    with session_scope("suppliers") as s:
         sup = s.get(Supplier, supplier_id)
         if not sup: return False
         sup.name = name; sup.category = category; sup.phone = phone; sup.address = address; sup.notes = notes; return True
 
 def delete_supplier(supplier_id):
-    with session_scope() as s:
+    with session_scope("suppliers", "supplier_transactions", "supplier_invoices") as s:
         sup = s.get(Supplier, supplier_id)
         if not sup: return False
         s.delete(sup); return True
 
+@cached_read("suppliers")
 def get_suppliers():
-    with session_scope() as s:
-        rows = s.query(Supplier).order_by(Supplier.id).all()
-        return [{"id": r.id, "name": r.name, "category": r.category, "phone": r.phone, "address": r.address, "balance": r.balance, "notes": r.notes} for r in rows]
+    with read_conn() as c:
+        rows = c.execute(select(Supplier.id, Supplier.name, Supplier.category, Supplier.phone, Supplier.address, Supplier.balance, Supplier.notes)
+                         .order_by(Supplier.id)).mappings()
+        return [dict(r) for r in rows]
+
+# id -> supplier row, built once per data version so a selection is a dict lookup
+@cached_read("suppliers")
+def suppliers_by_id():
+    return {r["id"]: r for r in get_suppliers()}
+
+@cached_read("suppliers")
+def supplier_options():
+    with read_session() as s:
+        rows = s.execute(select(Supplier.id, Supplier.name).order_by(Supplier.id)).all()
+        return [(f"{r.id} - {r.name}", r.id) for r in rows]
+
+def _add_to_supplier_balance(s, supplier_id, amount):
+    # one atomic UPDATE instead of SELECT + read-modify-write; no lost update between concurrent sessions
+    s.execute(update(Supplier).where(Supplier.id == supplier_id).values(balance=func.coalesce(Supplier.balance, 0.0) + (amount or 0.0)))
 
 def add_supplier_transaction(supplier_id, description, amount, payment_method):
-    with session_scope() as s:
+    with session_scope("supplier_transactions", "suppliers") as s:
         tr = SupplierTransaction(supplier_id=supplier_id, description=description, amount=amount, payment_method=payment_method, date=datetime.datetime.now())
         s.add(tr)
-        sup = s.get(Supplier, supplier_id)
-        if sup:
-            sup.balance = (sup.balance or 0.0) + (amount or 0.0)
+        _add_to_supplier_balance(s, supplier_id, amount)
         s.flush(); return tr.id
 
+@cached_read("supplier_transactions")
 def get_supplier_transactions(supplier_id):
-    with session_scope() as s:
-        rows = s.query(SupplierTransaction).filter_by(supplier_id=supplier_id).order_by(SupplierTransaction.date.desc()).all()
-        return [{"id": r.id, "date": r.date, "description": r.description, "amount": r.amount, "payment_method": r.payment_method} for r in rows]
+    with read_conn() as c:
+        rows = c.execute(select(SupplierTransaction.id, SupplierTransaction.date, SupplierTransaction.description, SupplierTransaction.amount, SupplierTransaction.payment_method)
+                         .where(SupplierTransaction.supplier_id == supplier_id).order_by(SupplierTransaction.date.desc())).mappings()
+        return [dict(r) for r in rows]
 
 def add_supplier_invoice(supplier_id, invoice_no, amount, description=None, date=None, paid=False):
     if date is None: date = datetime.datetime.now()
-    with session_scope() as s:
+    with session_scope("supplier_invoices", "suppliers") as s:
         inv = SupplierInvoice(supplier_id=supplier_id, invoice_no=invoice_no, amount=amount, description=description, date=date, paid=paid)
         s.add(inv)
         # add to supplier balance as debt (positive means we owe supplier)
-        sup = s.get(Supplier, supplier_id)
-        if sup:
-            sup.balance = (sup.balance or 0.0) + (amount or 0.0)
+        _add_to_supplier_balance(s, supplier_id, amount)
         s.flush(); return inv.id
 
+def bulk_add_supplier_invoices(rows):
+    # one executemany for the invoices, then one balance UPDATE per supplier rather than per invoice
+    now = datetime.datetime.now()
+    rows = [{"date": now, "paid": False, **r} for r in rows]
+    if not rows:
+        return 0
+    totals = {}
+    for r in rows:
+        totals[r["supplier_id"]] = totals.get(r["supplier_id"], 0.0) + (r.get("amount") or 0.0)
+    with session_scope("supplier_invoices", "suppliers") as s:
+        s.execute(insert(SupplierInvoice), rows)
+        for supplier_id, amount in totals.items():
+            _add_to_supplier_balance(s, supplier_id, amount)
+    return len(rows)
+
+@cached_read("supplier_invoices")
 def get_supplier_invoices(supplier_id):
-    with session_scope() as s:
-        rows = s.query(SupplierInvoice).filter_by(supplier_id=supplier_id).order_by(SupplierInvoice.date.desc()).all()
-        return [{"id": r.id, "invoice_no": r.invoice_no, "date": r.date, "amount": r.amount, "paid": r.paid, "description": r.description} for r in rows]
+    with read_conn() as c:
+        rows = c.execute(select(SupplierInvoice.id, SupplierInvoice.invoice_no, SupplierInvoice.date, SupplierInvoice.amount, SupplierInvoice.paid, SupplierInvoice.description)
+                         .where(SupplierInvoice.supplier_id == supplier_id).order_by(SupplierInvoice.date.desc())).mappings()
+        return [dict(r) for r in rows]
+
+@cached_read("suppliers", "supplier_transactions")
+def get_supplier_totals():
+    # per-supplier transaction totals summed in SQL and joined to the suppliers: one query for the whole report
+    totals = (select(SupplierTransaction.supplier_id, func.sum(SupplierTransaction.amount).label("total"))
+              .group_by(SupplierTransaction.supplier_id).subquery())
+    with read_conn() as c:
+        rows = c.execute(select(Supplier.id, Supplier.name, Supplier.category, func.coalesce(totals.c.total, 0.0).label("total_transactions"), Supplier.balance)
+                         .outerjoin(totals, totals.c.supplier_id == Supplier.id).order_by(Supplier.id)).mappings()
+        return [dict(r) for r in rows]
 
 # ---------------------------
 # Financial summaries & reports
 # ---------------------------
+@cached_read("payments", "appointments")
 def get_patient_financial_summary(patient_id):
-    with session_scope() as s:
-        payments = s.query(Payment).join(Appointment).filter(Appointment.patient_id == patient_id).all()
-        total_amount = sum((p.total_amount or 0.0) for p in payments)
-        total_paid = sum((p.paid_amount or 0.0) for p in payments)
+    with read_session() as s:
+        # one aggregate row; max() keeps the EpochDateTime type, so last_payment comes back as a datetime
+        total_amount, total_paid, last_payment = s.execute(
+            select(func.coalesce(func.sum(Payment.total_amount), 0.0), func.coalesce(func.sum(Payment.paid_amount), 0.0), func.max(Payment.date_paid))
+            .join(Appointment, Payment.appointment_id == Appointment.id).where(Appointment.patient_id == patient_id)).one()
         balance = total_amount - total_paid
-        last_payment = max([p.date_paid for p in payments if p.date_paid], default=None)
         return {"total_amount": total_amount, "total_paid": total_paid, "balance": balance, "last_payment": last_payment}
 
+@cached_read("payments", "daily_transactions", "expenses", "appointments")
 def get_daily_summary(date):
     # date: datetime.date
     start = datetime.datetime.combine(date, datetime.time.min)
     end = datetime.datetime.combine(date, datetime.time.max)
-    with session_scope() as s:
-        payments = s.query(Payment).filter(Payment.date_paid.between(start, end)).all()
-        income_from_payments = sum((p.paid_amount or 0.0) for p in payments)
-        # compute clinic/doctor shares from payments for accuracy
-        clinic_income_from_payments = sum((p.clinic_share or 0.0) for p in payments)
-        doctor_income_from_payments = sum((p.doctor_share or 0.0) for p in payments)
-        daily_entries = s.query(DailyTransaction).filter(DailyTransaction.date.between(start, end)).all()
-        extra_income = sum((d.income or 0.0) for d in daily_entries)
-        total_expense_from_daily = sum((d.expense or 0.0) for d in daily_entries)
-        expenses = s.query(Expense).filter(Expense.date.between(start, end)).all()
-        total_expenses = sum((e.amount or 0.0) for e in expenses) + total_expense_from_daily
+    with read_session() as s:
+        # SUM/COUNT run inside SQLite; no row is materialized in Python
+        income_from_payments, clinic_income_from_payments, doctor_income_from_payments = (
+            s.query(func.coalesce(func.sum(Payment.paid_amount), 0.0),
+                    # compute clinic/doctor shares from payments for accuracy
+                    func.coalesce(func.sum(Payment.clinic_share), 0.0),
+                    func.coalesce(func.sum(Payment.doctor_share), 0.0))
+            .filter(Payment.date_paid.between(start, end)).one())
+        extra_income, total_expense_from_daily = (
+            s.query(func.coalesce(func.sum(DailyTransaction.income), 0.0), func.coalesce(func.sum(DailyTransaction.expense), 0.0))
+            .filter(DailyTransaction.date.between(start, end)).one())
+        expenses_amount = s.query(func.coalesce(func.sum(Expense.amount), 0.0)).filter(Expense.date.between(start, end)).scalar()
+        total_expenses = expenses_amount + total_expense_from_daily
         # appointments count and unique patients
-        appointments = s.query(Appointment).filter(Appointment.date.between(start, end)).all()
-        patients_count = len(set(a.patient_id for a in appointments))
-        appointments_count = len(appointments)
+        appointments_count, patients_count = (
+            s.query(func.count(Appointment.id), func.count(func.distinct(Appointment.patient_id)))
+            .filter(Appointment.date.between(start, end)).one())
         # final sums
         total_income = income_from_payments + extra_income
         clinic_income = clinic_income_from_payments  # plus any clinic-specific extra incomes if needed
@@ -638,38 +981,80 @@ def get_daily_summary(date):
             "appointments_count": appointments_count
         }
 
+@cached_read("payments", "expenses", "daily_transactions")
 def get_monthly_financials(year, month):
+    # half-open month [start, next month) rather than BETWEEN and a 23:59:59 upper bound
     start = datetime.datetime(year, month, 1)
-    if month == 12:
-        end = datetime.datetime(year+1, 1, 1) - datetime.timedelta(seconds=1)
-    else:
-        end = datetime.datetime(year, month+1, 1) - datetime.timedelta(seconds=1)
-    with session_scope() as s:
-        payments = s.query(Payment).filter(Payment.date_paid.between(start, end)).all()
-        expenses = s.query(Expense).filter(Expense.date.between(start, end)).all()
-        daily = s.query(DailyTransaction).filter(DailyTransaction.date.between(start, end)).all()
-        recs = {}
-        for p in payments:
-            d = p.date_paid.date() if p.date_paid else None
-            if d:
-                recs.setdefault(d, {"income":0.0, "expense":0.0, "clinic":0.0, "doctor":0.0})
-                recs[d]["income"] += (p.paid_amount or 0.0)
-                recs[d]["clinic"] += (p.clinic_share or 0.0)
-                recs[d]["doctor"] += (p.doctor_share or 0.0)
-        for e in expenses:
-            d = e.date.date() if e.date else None
-            if d:
-                recs.setdefault(d, {"income":0.0, "expense":0.0, "clinic":0.0, "doctor":0.0})
-                recs[d]["expense"] += (e.amount or 0.0)
-        for dtx in daily:
-            d = dtx.date.date() if dtx.date else None
-            if d:
-                recs.setdefault(d, {"income":0.0, "expense":0.0, "clinic":0.0, "doctor":0.0})
-                recs[d]["income"] += (dtx.income or 0.0)
-                recs[d]["expense"] += (dtx.expense or 0.0)
-        dates = sorted(recs.keys())
-        rows = [{"date": d, "income": recs[d]["income"], "expense": recs[d]["expense"], "clinic": recs[d]["clinic"], "doctor": recs[d]["doctor"], "net": recs[d]["income"]-recs[d]["expense"]} for d in dates]
-        return rows
+    end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+    def in_month(col): return (col >= start) & (col < end)
+    with read_conn() as c:
+        # one UNION ALL of the three sources, bucketed and summed per day by SQLite
+        zero = literal(0.0)
+        rows = union_all(
+            select(func.date(Payment.date_paid, "unixepoch", type_=Date).label("day"), Payment.paid_amount.label("income"), zero.label("expense"), Payment.clinic_share.label("clinic"), Payment.doctor_share.label("doctor"))
+            .where(in_month(Payment.date_paid)),
+            select(func.date(Expense.date, "unixepoch", type_=Date), zero, Expense.amount, zero, zero).where(in_month(Expense.date)),
+            select(func.date(DailyTransaction.date, "unixepoch", type_=Date), DailyTransaction.income, DailyTransaction.expense, zero, zero).where(in_month(DailyTransaction.date)),
+        ).subquery()
+        totals = [func.coalesce(func.sum(rows.c[k]), 0.0) for k in ("income", "expense", "clinic", "doctor")]
+        return [{"date": r[0], "income": r[1], "expense": r[2], "clinic": r[3], "doctor": r[4], "net": r[1]-r[2]}
+                for r in c.execute(select(rows.c.day, *totals).group_by(rows.c.day).order_by(rows.c.day))]
+
+# Per-day totals, aggregated by SQLite instead of pulling every row into pandas
+@cached_read("payments")
+def get_payments_by_day(start_date, end_date):
+    start = datetime.datetime.combine(start_date, datetime.time.min)
+    end = datetime.datetime.combine(end_date, datetime.time.max)
+    with read_session() as s:
+        day = func.date(Payment.date_paid, "unixepoch", type_=Date).label("day")
+        rows = (s.query(day, func.sum(Payment.total_amount), func.sum(Payment.paid_amount), func.sum(Payment.clinic_share), func.sum(Payment.doctor_share))
+                .filter(Payment.date_paid.between(start, end)).group_by(day).order_by(day).all())
+        return [{"date": r[0], "total_amount": r[1] or 0.0, "paid_amount": r[2] or 0.0, "clinic_share": r[3] or 0.0, "doctor_share": r[4] or 0.0} for r in rows]
+
+@cached_read("expenses")
+def get_expenses_by_day(start_date, end_date):
+    start = datetime.datetime.combine(start_date, datetime.time.min)
+    end = datetime.datetime.combine(end_date, datetime.time.max)
+    with read_session() as s:
+        day = func.date(Expense.date, "unixepoch", type_=Date).label("day")
+        rows = s.query(day, func.sum(Expense.amount)).filter(Expense.date.between(start, end)).group_by(day).order_by(day).all()
+        return [{"date": r[0], "amount": r[1] or 0.0} for r in rows]
+
+# Report detail rows for the period straight from one JOINed SELECT into columns: no ORM objects,
+# and only the rows inside [start_date, end_date] leave SQLite
+@cached_read("payments", "appointments", "patients", "doctors", "treatments")
+def report_payments_frame(start_date, end_date):
+    start = datetime.datetime.combine(start_date, datetime.time.min)
+    end = datetime.datetime.combine(end_date, datetime.time.max)
+    unknown = literal("غير محدد")
+    stmt = (select(Payment.id, func.coalesce(Patient.name, unknown).label("patient_name"), func.coalesce(Doctor.name, unknown).label("doctor_name"),
+                   func.coalesce(Treatment.name, unknown).label("treatment_name"), *(func.coalesce(c, 0.0).label(c.key) for c in
+                   (Payment.total_amount, Payment.paid_amount, Payment.clinic_share, Payment.doctor_share, Payment.discounts, Payment.taxes)),
+                   func.date(Payment.date_paid, "unixepoch").label("date_paid"))
+            .outerjoin(Appointment, Payment.appointment_id == Appointment.id).outerjoin(Patient, Appointment.patient_id == Patient.id)
+            .outerjoin(Doctor, Appointment.doctor_id == Doctor.id).outerjoin(Treatment, Appointment.treatment_id == Treatment.id)
+            .where(Payment.date_paid.between(start, end)))
+    with read_conn() as c:
+        return pd.read_sql_query(stmt, c, parse_dates=["date_paid"])
+
+@cached_read("expenses")
+def report_expenses_frame(start_date, end_date):
+    start = datetime.datetime.combine(start_date, datetime.time.min)
+    end = datetime.datetime.combine(end_date, datetime.time.max)
+    stmt = (select(Expense.description, func.coalesce(Expense.amount, 0.0).label("amount"), func.date(Expense.date, "unixepoch").label("date"))
+            .where(Expense.date.between(start, end)))
+    with read_conn() as c:
+        return pd.read_sql_query(stmt, c, parse_dates=["date"])
+
+# Long-format income/expense series for the report chart, built once per data version and period
+@cached_read("payments", "expenses")
+def report_chart_frame(start_date, end_date):
+    pay_days = get_payments_by_day(start_date, end_date); exp_days = get_expenses_by_day(start_date, end_date)
+    return pd.DataFrame({
+        "التاريخ": [d["date"] for d in pay_days] + [d["date"] for d in exp_days],
+        "النوع": ["إيراد"] * len(pay_days) + ["مصروف"] * len(exp_days),
+        "القيمة": [d["paid_amount"] for d in pay_days] + [-d["amount"] for d in exp_days],
+    })
 
 # ---------------------------
 # UI Styling (white theme)
@@ -700,36 +1085,92 @@ def app_header_white():
 # Pages (Dashboard + CRUD + Financials + Suppliers)
 # ---------------------------
 
+# Arabic headers are applied by st.dataframe in the browser; the DataFrames keep English keys
+MONEY = "%.2f"
+PAYMENT_COLUMNS = {
+    "id": st.column_config.NumberColumn("رقم العملية"),
+    "appointment_id": st.column_config.NumberColumn("رقم الموعد"),
+    "patient_name": "اسم المريض", "doctor_name": "الطبيب", "treatment_name": "العلاج",
+    "total_amount": st.column_config.NumberColumn("المبلغ الكلي", format=MONEY),
+    "paid_amount": st.column_config.NumberColumn("المدفوع", format=MONEY),
+    "clinic_share": st.column_config.NumberColumn("نسبة العيادة", format=MONEY),
+    "doctor_share": st.column_config.NumberColumn("نسبة الطبيب", format=MONEY),
+    "payment_method": "طريقة الدفع",
+    "discounts": st.column_config.NumberColumn("الخصومات", format=MONEY),
+    "taxes": st.column_config.NumberColumn("الضرائب", format=MONEY),
+    "date_paid": st.column_config.DatetimeColumn("التاريخ"),
+}
+EXPENSE_COLUMNS = {
+    "id": st.column_config.NumberColumn("ID"),
+    "description": "الوصف", "category": "التصنيف",
+    "amount": st.column_config.NumberColumn("المبلغ", format=MONEY),
+    "date": st.column_config.DatetimeColumn("التاريخ"),
+}
+INVENTORY_COLUMNS = {
+    "id": st.column_config.NumberColumn("ID"),
+    "name": "الصنف", "quantity": st.column_config.NumberColumn("الكمية"), "unit": "الوحدة",
+    "cost_per_unit": st.column_config.NumberColumn("تكلفة الوحدة", format=MONEY),
+    "low_threshold": st.column_config.NumberColumn("حد التنبيه"),
+}
+
 def dashboard_page():
     st.header("لوحة التحكم")
-    today = datetime.date.today()
-    summary = get_daily_summary(today)
-    patients = get_patients(); appointments = get_appointments()
+    today = datetime.date.today(); now = datetime.datetime.now()
+    data = gather(summary=lambda: get_daily_summary(today), monthly=lambda: get_monthly_financials(now.year, now.month),
+                  patients=get_patient_count, low=get_low_inventory)
+    summary = data["summary"]
     c1,c2,c3,c4 = st.columns(4)
-    c1.metric("المرضى الكلّي", len(patients))
+    c1.metric("المرضى الكلّي", data["patients"])
     c2.metric("مواعيد اليوم", summary["appointments_count"])
     c3.metric("دخل اليوم", format_money(summary["income_total"]))
     c4.metric("مصروف اليوم", format_money(summary["expense_total"]))
     st.markdown("---")
     st.subheader("الرسم البياني الشهري")
-    now = datetime.datetime.now()
-    rows = get_monthly_financials(now.year, now.month)
+    rows = data["monthly"]
     if rows:
         dfm = pd.DataFrame(rows)
-        fig = px.line(dfm, x="date", y=["income","expense","net"], labels={"value":"المبلغ","variable":"البند"})
-        st.plotly_chart(fig, use_container_width=True)
+        # native Vega-Lite chart: a compact spec instead of a full plotly figure per rerun
+        st.line_chart(dfm, x="date", y=["income","expense","net"], y_label="المبلغ")
     else:
         st.info("لا توجد بيانات هذا الشهر")
     st.markdown("---")
     st.subheader("تنبيهات المخزون")
-    items = get_inventory_items()
-    low = [it for it in items if it["quantity"] is not None and it["quantity"] <= (it["low_threshold"] or 0)]
+    low = data["low"]
     if low:
         for it in low:
             st.markdown(f"- **{it['name']}**: الكمية الحالية {it['quantity']} {it['unit'] or ''}")
     else:
         st.success("جميع العناصر بكميات كافية")
 
+# switching the selected patient reruns only the details, not the list and search above
+@st.fragment
+def patient_details_fragment(df):
+    st.markdown("### تفاصيل المريض")
+    # native int options with a None placeholder: no str/int round trip on each rerun
+    pid = st.selectbox("اختر ID المريض", options=[None, *df["id"].tolist()], format_func=lambda x: "" if x is None else str(x))
+    if pid is not None:
+        # the selected row of the cached frame, with NA cells as None like the form values
+        rows = df.loc[df["id"] == pid].astype(object)
+        p = rows.where(rows.notna(), None).to_dict("records")[0] if len(rows) else None
+        if p:
+            st.subheader(f"{p['name']}")
+            st.write(f"العمر: {p['age']} — الجنس: {p['gender'] or '-'} — الهاتف: {p['phone'] or '-'}")
+            st.write("التاريخ الطبي:"); st.write(p["medical_history"] or "-")
+            fin = get_patient_financial_summary(pid)
+            st.markdown("**الملف المالي**")
+            st.metric("إجمالي الفواتير", format_money(fin["total_amount"]))
+            st.metric("المدفوع", format_money(fin["total_paid"]))
+            st.metric("المتبقي (دين)", format_money(fin["balance"]))
+            st.write(f"آخر دفعة: {fin['last_payment'] if fin['last_payment'] else '-'}")
+            st.markdown("سجل المواعيد:")
+            appts = appointments_by_patient().get(pid, [])
+            if appts: st.dataframe(pd.DataFrame(appts), use_container_width=True)
+            else: st.info("لا توجد مواعيد")
+            if st.button("حذف المريض"):
+                ok = delete_patient(pid)
+                if ok: st.success("تم الحذف"); st.rerun(scope="app")
+                else: st.error("فشل الحذف")
+
 def patients_page_ui():
     st.header("إدارة المرضى")
     with st.expander("إضافة مريض جديد", expanded=False):
@@ -739,7 +1180,7 @@ def patients_page_ui():
                 name = st.text_input("الاسم")
                 age = st.number_input("العمر", min_value=0, value=0)
             with col2:
-                gender = st.selectbox("الجنس", ["", "ذكر", "أنثى"])
+                gender = st.selectbox("الجنس", GENDERS)
                 phone = st.text_input("الهاتف")
             with col3:
                 address = st.text_input("العنوان")
@@ -750,37 +1191,19 @@ def patients_page_ui():
                 else:
                     pid = add_patient(name=name.strip(), age=int(age), gender=gender or None, phone=phone or None, address=address or None, medical_history=medical_history or None, image=image)
                     st.success(f"تمت إضافة المريض (ID: {pid})")
+    with st.expander("استيراد CSV", expanded=False):
+        st.caption("الأعمدة: name, age, gender, phone, address, medical_history")
+        up = st.file_uploader("ملف CSV", type="csv", key="pat_csv")
+        if up is not None and st.button("استيراد", key="pat_csv_btn"):
+            run_csv_import(bulk_add_patients, csv_rows(up, ["name","age","gender","phone","address","medical_history"], numeric_columns=["age"], required=["name"]))
     st.markdown("---")
-    patients = get_patients()
-    df = pd.DataFrame(patients) if patients else pd.DataFrame(columns=["id","name","age","gender","phone","address"])
+    patients = patients_dataframe(); df = patients
     search = st.text_input("بحث (الاسم/الهاتف/العنوان)")
     if search:
-        df = df[df.astype(str).apply(lambda col: col.str.contains(search, case=False, na=False)).any(axis=1)]
-    st.dataframe(df, use_container_width=True)
-    st.markdown("### تفاصيل المريض")
-    ids = [r["id"] for r in patients]
-    sel = st.selectbox("اختر ID المريض", options=[""] + ids)
-    if sel:
-        pid = int(sel)
-        p = next((x for x in patients if x["id"] == pid), None)
-        if p:
-            st.subheader(f"{p['name']}")
-            st.write(f"العمر: {p['age']} — الجنس: {p['gender'] or '-'} — الهاتف: {p['phone'] or '-'}")
-            st.write("التاريخ الطبي:"); st.write(p["medical_history"] or "-")
-            fin = get_patient_financial_summary(pid)
-            st.markdown("**الملف المالي**")
-            st.metric("إجمالي الفواتير", format_money(fin["total_amount"]))
-            st.metric("المدفوع", format_money(fin["total_paid"]))
-            st.metric("المتبقي (دين)", format_money(fin["balance"]))
-            st.write(f"آخر دفعة: {fin['last_payment'] if fin['last_payment'] else '-'}")
-            st.markdown("سجل المواعيد:")
-            appts = [a for a in get_appointments() if a["patient_id"] == pid]
-            if appts: st.dataframe(pd.DataFrame(appts), use_container_width=True)
-            else: st.info("لا توجد مواعيد")
-            if st.button("حذف المريض"):
-                ok = delete_patient(pid)
-                if ok: st.success("تم الحذف"); st.experimental_rerun()
-                else: st.error("فشل الحذف")
+        df = df[df["_search"].str.contains(search.lower(), regex=False)]
+    st.dataframe(df, use_container_width=True, column_config={"_search": None})
+    # the details picker lists every patient, from the same cached frame
+    patient_details_fragment(patients)
 
 def doctors_page_ui():
     st.header("إدارة الأطباء")
@@ -793,9 +1216,13 @@ def doctors_page_ui():
                 else:
                     did = add_doctor(name=name.strip(), specialty=specialty or None, phone=phone or None, email=email or None)
                     st.success(f"تمت الإضافة (ID: {did})")
+    with st.expander("استيراد CSV", expanded=False):
+        st.caption("الأعمدة: name, specialty, phone, email")
+        up = st.file_uploader("ملف CSV", type="csv", key="doc_csv")
+        if up is not None and st.button("استيراد", key="doc_csv_btn"):
+            run_csv_import(bulk_add_doctors, csv_rows(up, ["name","specialty","phone","email"], required=["name"]))
     st.markdown("---")
-    docs = get_doctors()
-    st.dataframe(pd.DataFrame(docs) if docs else pd.DataFrame(columns=["id","name","specialty","phone","email"]), use_container_width=True)
+    st.dataframe(doctors_dataframe(), use_container_width=True)
 
 def treatments_page_ui():
     st.header("إدارة العلاجات")
@@ -806,15 +1233,17 @@ def treatments_page_ui():
                 if not name.strip(): st.error("الاسم مطلوب")
                 else:
                     tid = add_treatment(name=name.strip(), base_cost=float(base_cost)); st.success(f"تمت الإضافة (ID: {tid})")
+    with st.expander("استيراد CSV", expanded=False):
+        st.caption("الأعمدة: name, base_cost")
+        up = st.file_uploader("ملف CSV", type="csv", key="treat_csv")
+        if up is not None and st.button("استيراد", key="treat_csv_btn"):
+            run_csv_import(bulk_add_treatments, csv_rows(up, ["name","base_cost"], numeric_columns=["base_cost"], required=["name"]))
     st.markdown("---")
-    treatments = get_treatments()
-    st.dataframe(pd.DataFrame(treatments) if treatments else pd.DataFrame(columns=["id","name","base_cost"]), use_container_width=True)
+    st.dataframe(treatments_dataframe(), use_container_width=True)
     st.markdown("إعداد نسب التوزيع")
-    doctors = get_doctors()
-    if doctors and treatments:
+    t_opts = treatment_options(); d_opts = doctor_options()
+    if d_opts and t_opts:
         with st.form("set_tp"):
-            t_opts = [(f"{t['id']} - {t['name']}", t['id']) for t in treatments]
-            d_opts = [(f"{d['id']} - {d['name']}", d['id']) for d in doctors]
             t_choice = st.selectbox("اختر علاج", options=[("",None)] + t_opts, format_func=lambda x: x[0] if x else "")
             d_choice = st.selectbox("اختر طبيب", options=[("",None)] + d_opts, format_func=lambda x: x[0] if x else "")
             clinic_perc = st.number_input("نسبة العيادة (%)", min_value=0.0, max_value=100.0, value=50.0)
@@ -829,12 +1258,9 @@ def treatments_page_ui():
 
 def appointments_page_ui():
     st.header("إدارة المواعيد")
-    patients = get_patients(); doctors = get_doctors(); treatments = get_treatments()
+    p_opts = patient_options(); d_opts = doctor_options(); t_opts = treatment_options()
     with st.expander("حجز موعد جديد", expanded=False):
         with st.form("add_appt"):
-            p_opts = [(f"{p['id']} - {p['name']}", p['id']) for p in patients]
-            d_opts = [(f"{d['id']} - {d['name']}", d['id']) for d in doctors]
-            t_opts = [(f"{t['id']} - {t['name']}", t['id']) for t in treatments]
             p_choice = st.selectbox("المريض", options=[("",None)] + p_opts, format_func=lambda x: x[0] if x else "")
             d_choice = st.selectbox("الطبيب", options=[("",None)] + d_opts, format_func=lambda x: x[0] if x else "")
             t_choice = st.selectbox("العلاج", options=[("",None)] + t_opts, format_func=lambda x: x[0] if x else "")
@@ -845,29 +1271,48 @@ def appointments_page_ui():
                 else:
                     aid = add_appointment(patient_id=p_choice[1], doctor_id=d_choice[1], treatment_id=t_choice[1], date=date, status="مجدول", notes=notes); st.success(f"تم حجز الموعد (ID: {aid})")
     st.markdown("---")
-    appts = get_appointments()
-    st.dataframe(pd.DataFrame(appts) if appts else pd.DataFrame(columns=["id","patient_name","doctor_name","treatment_name","date","status"]), use_container_width=True)
+    st.dataframe(appointments_dataframe(), use_container_width=True)
+
+# invoice picking reruns only this block, not the payments query and table above it
+@st.fragment
+def invoice_print_fragment(ids):
+    st.markdown("طباعة فاتورة"); sel = st.selectbox("اختر دفعة للطباعة", options=[None, *ids], format_func=lambda x: "" if x is None else str(x))
+    # the PDF is laid out only after an explicit click; later reruns hit the versioned invoice cache
+    # one session key per picker, overwritten by each new selection, holds what was generated
+    if sel is not None:
+        if st.session_state.get("inv_one") != sel and st.button("توليد الفاتورة"): st.session_state["inv_one"] = sel
+        if st.session_state.get("inv_one") == sel: st.download_button("تحميل PDF الفاتورة", data=invoice_pdf_bytes(sel), file_name=f"invoice_{sel}.pdf", mime="application/pdf")
+    batch = tuple(st.multiselect("طباعة عدة فواتير في ملف واحد", options=ids))
+    if batch:
+        if st.session_state.get("inv_batch") != batch and st.button("توليد الفواتير"): st.session_state["inv_batch"] = batch
+        if st.session_state.get("inv_batch") == batch: st.download_button("تحميل PDF الفواتير", data=invoices_pdf_bytes(batch), file_name="invoices.pdf", mime="application/pdf")
 
 def payments_page_ui():
     st.header("الدفعات والفواتير")
-    appts = get_appointments(); payments = get_payments()
     with st.expander("تسجيل دفعة", expanded=False):
         with st.form("add_pay"):
-            appt_opts = [(f"{a['id']} - {a['patient_name']}", a['id']) for a in appts]
-            appt_choice = st.selectbox("اختر موعد (اختياري)", options=[("",None)] + appt_opts, format_func=lambda x: x[0] if x else "")
+            appt_choice = st.selectbox("اختر موعد (اختياري)", options=[("",None)] + appointment_options(), format_func=lambda x: x[0] if x else "")
             total_amount = st.number_input("المبلغ الإجمالي", min_value=0.0, value=0.0)
             discounts = st.number_input("الخصم", min_value=0.0, value=0.0)
             taxes = st.number_input("الضرائب", min_value=0.0, value=0.0)
             paid_amount = st.number_input("المبلغ المدفوع", min_value=0.0, value=0.0)
-            payment_method = st.selectbox("طريقة الدفع", ["نقدًا", "بطاقة", "تحويل بنكي", "أخرى"])
+            payment_method = st.selectbox("طريقة الدفع", PAYMENT_METHODS)
             if st.form_submit_button("تسجيل الدفعة"):
                 appt_id = appt_choice[1] if appt_choice else None
                 pid = add_payment(appointment_id=appt_id, total_amount=float(total_amount), paid_amount=float(paid_amount), payment_method=payment_method, discounts=float(discounts), taxes=float(taxes)); st.success(f"تم تسجيل الدفعة (ID: {pid})")
+    with st.expander("استيراد CSV", expanded=False):
+        st.caption("الأعمدة: appointment_id, total_amount, paid_amount, payment_method, discounts, taxes, date_paid")
+        up = st.file_uploader("ملف CSV", type="csv", key="pay_csv")
+        if up is not None and st.button("استيراد", key="pay_csv_btn"):
+            run_csv_import(bulk_add_payments, csv_rows(up, ["appointment_id","total_amount","paid_amount","payment_method","discounts","taxes","date_paid"], ["date_paid"],
+                                                       ["appointment_id","total_amount","paid_amount","discounts","taxes"], required=["total_amount"]))
     st.markdown("---")
-    st.dataframe(pd.DataFrame(payments) if payments else pd.DataFrame(columns=["id","date_paid","total_amount","paid_amount"]), use_container_width=True)
-    st.markdown("طباعة فاتورة"); ids = [r["id"] for r in payments]; sel = st.selectbox("اختر دفعة للطباعة", options=[""] + ids)
-    if sel:
-        buf = generate_invoice_pdf_buffer(payment_id=int(sel)); st.download_button("تحميل PDF الفاتورة", data=buf, file_name=f"invoice_{sel}.pdf", mime="application/pdf")
+    # the table is loaded and sent to the browser only on request; adding a row does not pay for it
+    # one page of the newest payments at a time; older ones are a page number away
+    pages = max(1, -(-payment_count() // PAYMENTS_PAGE_SIZE))
+    page = st.number_input(f"صفحة الدفعات (من {pages})", min_value=1, max_value=pages, value=1, step=1, key="pay_page") if pages > 1 else 1
+    if st.toggle("عرض قائمة الدفعات", value=False, key="show_pay"): st.dataframe(payments_dataframe(page), use_container_width=True, column_config=PAYMENT_COLUMNS)
+    invoice_print_fragment(payment_ids(page))
 
 def expenses_page_ui():
     st.header("المصروفات")
@@ -876,8 +1321,13 @@ def expenses_page_ui():
             desc = st.text_input("البيان"); category = st.text_input("التصنيف"); amount = st.number_input("المبلغ", min_value=0.0, value=0.0); date = st.date_input("التاريخ", value=datetime.date.today())
             if st.form_submit_button("حفظ"):
                 add_expense(description=desc or None, category=category or None, amount=float(amount), date=datetime.datetime.combine(date, datetime.datetime.min.time())); st.success("تم الحفظ")
+    with st.expander("استيراد CSV", expanded=False):
+        st.caption("الأعمدة: description, category, amount, date")
+        up = st.file_uploader("ملف CSV", type="csv", key="exp_csv")
+        if up is not None and st.button("استيراد", key="exp_csv_btn"):
+            run_csv_import(bulk_add_expenses, csv_rows(up, ["description","category","amount","date"], ["date"], ["amount"], required=["amount"]))
     st.markdown("---")
-    exps = get_expenses(); st.dataframe(pd.DataFrame(exps) if exps else pd.DataFrame(columns=["id","description","category","amount","date"]), use_container_width=True)
+    if st.toggle("عرض قائمة المصروفات", value=False, key="show_exp"): st.dataframe(expenses_dataframe(), use_container_width=True, column_config=EXPENSE_COLUMNS)
 
 def inventory_page_ui():
     st.header("إدارة المخزون")
@@ -888,12 +1338,18 @@ def inventory_page_ui():
                 if not name.strip(): st.error("أدخل اسم الصنف")
                 else:
                     iid = add_inventory_item(name=name.strip(), quantity=float(quantity), unit=unit or None, cost_per_unit=float(cost), low_threshold=float(low)); st.success(f"تمت الإضافة (ID: {iid})")
+    with st.expander("استيراد CSV", expanded=False):
+        st.caption("الأعمدة: name, quantity, unit, cost_per_unit, low_threshold")
+        up = st.file_uploader("ملف CSV", type="csv", key="inv_csv")
+        if up is not None and st.button("استيراد", key="inv_csv_btn"):
+            run_csv_import(bulk_add_inventory_items, csv_rows(up, ["name","quantity","unit","cost_per_unit","low_threshold"], numeric_columns=["quantity","cost_per_unit","low_threshold"], required=["name"]))
     st.markdown("---")
-    items = get_inventory_items(); st.dataframe(pd.DataFrame(items) if items else pd.DataFrame(columns=["id","name","quantity","unit","cost_per_unit","low_threshold"]), use_container_width=True)
+    if st.toggle("عرض قائمة المخزون", value=False, key="show_inv"): st.dataframe(inventory_dataframe(), use_container_width=True, column_config=INVENTORY_COLUMNS)
 
 def daily_entry_ui():
     st.header("الإدخال اليومي (حالات منجزة وحساب تلقائي للنسب)")
-    sessions_t = get_treatments(); sessions_d = get_doctors()
+    # cached (label, id) options: the id rides in the choice, nothing to parse back out of the label
+    t_opts = [("",None)] + treatment_options(); d_opts = [("",None)] + doctor_options()
     # We'll allow multiple rows of entries dynamically via number_input
     rows_count = st.number_input("كم حالة تريد إدخالها الآن؟", min_value=1, max_value=20, value=3, step=1)
     with st.form("daily_entry_form"):
@@ -903,14 +1359,14 @@ def daily_entry_ui():
         for i in range(int(rows_count)):
             c1, c2, c3, c4 = st.columns([3,3,2,4])
             with c1:
-                t_choice = st.selectbox(f"العلاج #{i+1}", options=[""] + [f"{t['id']} - {t['name']}" for t in sessions_t], key=f"t_{i}")
+                t_choice = st.selectbox(f"العلاج #{i+1}", options=t_opts, format_func=lambda x: x[0] if x else "", key=f"t_{i}")
             with c2:
-                d_choice = st.selectbox(f"الطبيب #{i+1}", options=[""] + [f"{d['id']} - {d['name']}" for d in sessions_d], key=f"d_{i}")
+                d_choice = st.selectbox(f"الطبيب #{i+1}", options=d_opts, format_func=lambda x: x[0] if x else "", key=f"d_{i}")
             with c3:
                 cost = st.number_input(f"تكلفة #{i+1}", min_value=0.0, key=f"cost_{i}")
             with c4:
                 note = st.text_input(f"ملاحظات #{i+1}", key=f"note_{i}")
-            entries.append((t_choice, d_choice, cost, note))
+            entries.append((t_choice[1], d_choice[1], cost, note))
         st.markdown("---")
         st.write("المصروفات الإضافية اليوم (غير المرتبطة بمورد محدد)")
         extra_expenses = st.number_input("مصروفات إضافية اليوم", min_value=0.0, value=0.0)
@@ -920,24 +1376,15 @@ def daily_entry_ui():
             total_income = 0.0
             clinic_income = 0.0
             doctor_income = 0.0
-            # For each entry, compute shares using TreatmentPercentage if exists
-            with session_scope() as s:
-                for t_choice, d_choice, cost, note in entries:
-                    if not t_choice or not d_choice or (cost is None) or cost <= 0:
-                        continue
-                    try:
-                        t_id = int(t_choice.split(" - ")[0])
-                        d_id = int(d_choice.split(" - ")[0])
-                    except Exception:
+            # For each entry, compute shares using TreatmentPercentage if exists, from the cached (treatment, doctor) map
+            percentages = percentage_map()
+            with session_scope("daily_summaries") as s:
+                for t_id, d_id, cost, note in entries:
+                    if t_id is None or d_id is None or (cost is None) or cost <= 0:
                         continue
-                    # find perc
-                    perc = s.query(TreatmentPercentage).filter_by(treatment_id=t_id, doctor_id=d_id).first()
-                    if perc:
-                        clinic_share = (perc.clinic_percentage or 50.0) * cost / 100.0
-                        doctor_share = (perc.doctor_percentage or 50.0) * cost / 100.0
-                    else:
-                        clinic_share = cost * 0.5
-                        doctor_share = cost * 0.5
+                    clinic_p, doctor_p = percentages.get((t_id, d_id), (50.0, 50.0))
+                    clinic_share = clinic_p * cost / 100.0
+                    doctor_share = doctor_p * cost / 100.0
                     total_income += cost
                     clinic_income += clinic_share
                     doctor_income += doctor_share
@@ -953,40 +1400,19 @@ def daily_entry_ui():
 
 def daily_summary_ui():
     st.header("الملخّصات اليومية")
-    rows = get_daily_summaries()
-    df = pd.DataFrame(rows) if rows else pd.DataFrame(columns=["id","date","total_income","clinic_income","doctor_income","total_expenses","net_profit","notes"])
+    df = daily_summaries_dataframe()
     st.dataframe(df, use_container_width=True)
     if not df.empty:
-        fig = px.bar(df, x="date", y=["clinic_income","doctor_income","net_profit"], title="ملخّصات يومية")
-        st.plotly_chart(fig, use_container_width=True)
+        st.caption("ملخّصات يومية")
+        st.bar_chart(df, x="date", y=["clinic_income","doctor_income","net_profit"])
     # export
     if st.button("تحميل ملخّصات كـ Excel"):
         bytes_x = df_to_excel_bytes(df)
         st.download_button("تحميل Excel", data=bytes_x, file_name="daily_summaries.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
-from sqlalchemy.orm import joinedload
-
 def financial_reports_page():
     st.title("📊 التقارير المالية المتقدمة")
 
-    session = Session()
-    payments = session.query(Payment).options(
-        joinedload(Payment.appointment)
-        .joinedload(Appointment.patient),
-        joinedload(Payment.appointment)
-        .joinedload(Appointment.doctor),
-        joinedload(Payment.appointment)
-        .joinedload(Appointment.treatment)
-    ).all()
-
-    expenses = session.query(Expense).all()
-    session.close()
-
-
-    if not payments and not expenses:
-        st.info("لا توجد بيانات مالية بعد.")
-        return
-
     st.subheader("تحديد الفترة الزمنية للتقرير")
     col1, col2 = st.columns(2)
     with col1:
@@ -994,42 +1420,23 @@ def financial_reports_page():
     with col2:
         end_date = st.date_input("تاريخ النهاية", datetime.date.today())
 
+    # the per-day aggregates are cheap; an empty period skips the frames, metrics and chart
+    pay_days = get_payments_by_day(start_date, end_date)
+    exp_days = get_expenses_by_day(start_date, end_date)
+    if not pay_days and not exp_days:
+        st.info("لا توجد بيانات مالية في الفترة المحددة.")
+        return
+
     # ---- بيانات المدفوعات ----
-    df_pay = pd.DataFrame([{
-        "رقم العملية": p.id,
-        "اسم المريض": p.appointment.patient.name if p.appointment and p.appointment.patient else "غير محدد",
-        "الطبيب": p.appointment.doctor.name if p.appointment and p.appointment.doctor else "غير محدد",
-        "العلاج": p.appointment.treatment.name if p.appointment and p.appointment.treatment else "غير محدد",
-        "المبلغ الكلي": p.total_amount,
-        "المدفوع": p.paid_amount,
-        "نسبة العيادة": p.clinic_share,
-        "نسبة الطبيب": p.doctor_share,
-        "الخصومات": p.discounts,
-        "الضرائب": p.taxes,
-        "التاريخ": p.date_paid
-    } for p in payments])
-
-    if not df_pay.empty:
-        # تحويل عمود التاريخ إلى نوع تاريخي
-        df_pay["التاريخ"] = pd.to_datetime(df_pay["التاريخ"]).dt.date
-
-        # فلترة حسب المدة المحددة
-        df_pay = df_pay[(df_pay["التاريخ"] >= start_date) & (df_pay["التاريخ"] <= end_date)]
+    df_pay = report_payments_frame(start_date, end_date)
 
     # ---- بيانات المصروفات ----
-    df_exp = pd.DataFrame([{
-        "الوصف": e.description,
-        "المبلغ": e.amount,
-        "التاريخ": e.date
-    } for e in expenses])
-
-    if not df_exp.empty:
-        df_exp["التاريخ"] = pd.to_datetime(df_exp["التاريخ"]).dt.date
-        df_exp = df_exp[(df_exp["التاريخ"] >= start_date) & (df_exp["التاريخ"] <= end_date)]
+    df_exp = report_expenses_frame(start_date, end_date)
 
     # ---- حساب الإجماليات ----
-    total_income = df_pay["المدفوع"].sum() if not df_pay.empty else 0
-    total_expenses = df_exp["المبلغ"].sum() if not df_exp.empty else 0
+    # the period frames come from SQL as float64 with NULL amounts as 0; reduce the arrays directly
+    total_income = float(np.add.reduce(df_pay["paid_amount"].to_numpy(dtype=np.float64, copy=False)))
+    total_expenses = float(np.add.reduce(df_exp["amount"].to_numpy(dtype=np.float64, copy=False)))
     clinic_net = total_income - total_expenses
 
     st.subheader("الملخص المالي")
@@ -1043,31 +1450,21 @@ def financial_reports_page():
 
     # ---- عرض التفاصيل ----
     with st.expander("عرض تفاصيل الإيرادات"):
-        st.dataframe(df_pay, use_container_width=True)
+        st.dataframe(df_pay, use_container_width=True, column_config={**PAYMENT_COLUMNS, "date_paid": st.column_config.DateColumn("التاريخ")})
 
     with st.expander("عرض تفاصيل المصروفات"):
-        st.dataframe(df_exp, use_container_width=True)
+        st.dataframe(df_exp, use_container_width=True, column_config={**EXPENSE_COLUMNS, "date": st.column_config.DateColumn("التاريخ")})
 
     # ---- رسم بياني ----
-    if not df_pay.empty or not df_exp.empty:
-        combined_data = []
-        if not df_pay.empty:
-            for _, r in df_pay.iterrows():
-                combined_data.append({"التاريخ": r["التاريخ"], "النوع": "إيراد", "القيمة": r["المدفوع"]})
-        if not df_exp.empty:
-            for _, r in df_exp.iterrows():
-                combined_data.append({"التاريخ": r["التاريخ"], "النوع": "مصروف", "القيمة": -r["المبلغ"]})
-        df_chart = pd.DataFrame(combined_data)
-        df_chart = df_chart.groupby(["التاريخ", "النوع"]).sum().reset_index()
-        st.subheader("التحليل الزمني")
-        fig = px.line(df_chart, x="التاريخ", y="القيمة", color="النوع", markers=True)
-        st.plotly_chart(fig, use_container_width=True)
+    df_chart = report_chart_frame(start_date, end_date)
+    st.subheader("التحليل الزمني")
+    st.line_chart(df_chart, x="التاريخ", y="القيمة", color="النوع")
 
 def suppliers_page_ui():
     st.header("الموردين والمعامل")
     with st.expander("إضافة مورد / معمل جديد", expanded=False):
         with st.form("add_supplier"):
-            name = st.text_input("الاسم"); category = st.selectbox("النوع", ["خامات", "معمل", "خدمات"])
+            name = st.text_input("الاسم"); category = st.selectbox("النوع", SUPPLIER_CATEGORIES)
             phone = st.text_input("الهاتف"); address = st.text_input("العنوان"); notes = st.text_area("ملاحظات")
             if st.form_submit_button("إضافة"):
                 if not name.strip(): st.error("الاسم مطلوب")
@@ -1081,15 +1478,14 @@ def suppliers_page_ui():
 
 def supplier_details_ui():
     st.header("تفاصيل مورد / معمل")
-    suppliers = get_suppliers()
-    if not suppliers:
+    options = supplier_options()
+    if not options:
         st.info("لا توجد موردين بعد")
         return
-    options = [f"{s['id']} - {s['name']}" for s in suppliers]
-    sel = st.selectbox("اختر موردًا", options)
+    sel = st.selectbox("اختر موردًا", options, format_func=lambda x: x[0])
     if sel:
-        sid = int(sel.split(" - ")[0])
-        sup = next((x for x in suppliers if x["id"] == sid), None)
+        sid = sel[1]
+        sup = suppliers_by_id().get(sid)
         if sup:
             st.subheader(f"{sup['name']}")
             st.write(f"النوع: {sup['category'] or '-'} — الهاتف: {sup['phone'] or '-'}")
@@ -1100,7 +1496,7 @@ def supplier_details_ui():
             with st.form("add_sup_tr"):
                 desc = st.text_input("البيان")
                 amount = st.number_input("المبلغ (قيمة موجبة تزيد الرصيد)", value=0.0)
-                method = st.selectbox("طريقة الدفع", ["نقدي", "تحويل بنكي", "شيك", "أخرى"])
+                method = st.selectbox("طريقة الدفع", SUPPLIER_PAYMENT_METHODS)
                 if st.form_submit_button("حفظ الحركة"):
                     add_supplier_transaction(supplier_id=sid, description=desc or None, amount=float(amount), payment_method=method or None)
                     st.success("تم حفظ الحركة")
@@ -1113,7 +1509,7 @@ def supplier_details_ui():
                 inv_date = st.date_input("تاريخ الفاتورة", value=datetime.date.today())
                 paid_flag = st.checkbox("مدفوعة الآن")
                 if st.form_submit_button("حفظ الفاتورة"):
-                    add_supplier_invoice(supplier_id=sid, invoice_no=inv_no or f"INV-{uuid.uuid4().hex[:6]}", amount=float(inv_amount), description=inv_desc or None, date=datetime.datetime.combine(inv_date, datetime.datetime.min.time()), paid=bool(paid_flag))
+                    add_supplier_invoice(supplier_id=sid, invoice_no=inv_no or f"INV-{secrets.token_hex(3)}", amount=float(inv_amount), description=inv_desc or None, date=datetime.datetime.combine(inv_date, datetime.datetime.min.time()), paid=bool(paid_flag))
                     st.success("تم إضافة الفاتورة")
             st.markdown("---")
             st.subheader("سجل الحركات")
@@ -1125,15 +1521,12 @@ def supplier_details_ui():
 
 def suppliers_report_ui():
     st.header("تقارير الموردين والمعامل")
-    suppliers = get_suppliers()
-    data = []
-    for s in suppliers:
-        trans = get_supplier_transactions(s["id"])
-        total_transactions = sum(t["amount"] for t in trans) if trans else 0.0
-        data.append({"الاسم": s["name"], "النوع": s["category"], "إجمالي التعاملات": total_transactions, "الرصيد الحالي": s["balance"] or 0.0})
+    data = [{"الاسم": s["name"], "النوع": s["category"], "إجمالي التعاملات": s["total_transactions"], "الرصيد الحالي": s["balance"] or 0.0}
+            for s in get_supplier_totals()]
     df = pd.DataFrame(data) if data else pd.DataFrame()
     st.dataframe(df, use_container_width=True)
     if not df.empty:
+        import plotly.express as px  # heavy import, only paid by the page that still draws a plotly chart
         fig = px.bar(df, x="الاسم", y="الرصيد الحالي", color="النوع", title="الرصيد الحالي لكل مورد / معمل")
         st.plotly_chart(fig, use_container_width=True)
 
@@ -1143,6 +1536,9 @@ def suppliers_report_ui():
 def download_db_button():
     db_path = DB_URI.replace("sqlite:///", "")
     if os.path.exists(db_path):
+        # fold the WAL back into the main file so the backup holds every committed row
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
         with open(db_path, "rb") as f:
             st.download_button("تحميل نسخة احتياطية من قاعدة البيانات (.db)", f, file_name=os.path.basename(db_path))
 